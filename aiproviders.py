@@ -26,16 +26,13 @@ PROVIDERS = {
 }
 
 
+# (provider, cfg_key) for every provider that takes a key, in menu order.
+_PROVIDER_CFG_KEYS = tuple((p, m["cfg_key"]) for p, m in PROVIDERS.items() if m["cfg_key"])
+
+
 def get_available_providers_from_config(cfg: dict):
     """Return list of providers that have keys present in config."""
-    available = []
-    for p, meta in PROVIDERS.items():
-        if p == "none":
-            continue
-        k = (cfg.get(meta["cfg_key"]) or "").strip()
-        if k:
-            available.append(p)
-    return available
+    return [p for p, k in _PROVIDER_CFG_KEYS if (cfg.get(k) or "").strip()]
 
 
 # ----------------------------
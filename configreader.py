@@ -1,11 +1,24 @@
 import os
 import json
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
 
 # ----------------------------
 # Config file helpers
 # ----------------------------
 
+# (config key, environment variable) for every provider API key.
+_KEY_MAP = (
+    ("openai_key", "OPENAI_API_KEY"),
+    ("anthropic_key", "ANTHROPIC_API_KEY"),
+    ("gemini_key", "GOOGLE_API_KEY"),
+)
+
+
 def get_config_path():
     """
     Default: ~/.config/thinkshell/config.json
@@ -19,6 +32,17 @@ def get_config_path():
     return os.path.join(xdg, "thinkshell", "config.json")
 
 
+def _private_opener(path, flags):
+    # New files are created as 0600 up front, so the chmod below is usually skipped.
+    return os.open(path, flags, 0o600)
+
+
+def _restrict_permissions(path: str):
+    """chmod 0600 only when the mode differs; saves a syscall on every save."""
+    if (os.stat(path).st_mode & 0o777) != 0o600:
+        os.chmod(path, 0o600)
+
+
 def ensure_config_file_exists(path: str):
     """
     If config file doesn't exist, create parent dir and write an empty JSON object.
@@ -30,14 +54,14 @@ def ensure_config_file_exists(path: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
     # Create a minimal valid config file
-    with open(path, "w", encoding="utf-8") as f:
+    with open(path, "w", encoding="utf-8", opener=_private_opener) as f:
         f.write("{}\n")
 
     # Restrict permissions (best-effort; Windows may behave differently)
     # noinspection PyBroadException
     try:
         print("Providing permissions to configuration file...")
-        os.chmod(path, 0o600)
+        _restrict_permissions(path)
     except Exception:
         print("\nError while providing permissions to configuration file...")
         print("\nContinuing with default permissions...")
@@ -52,8 +76,9 @@ def load_config():
 
     # noinspection PyBroadException
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f) or {}
+        with open(path, "rb") as f:
+            raw = f.read()
+        return (orjson.loads(raw) if orjson is not None else json.loads(raw)) or {}
     except FileNotFoundError:
         print("Configuration file not found...")
         print("Initializing with default configurations...")
@@ -70,12 +95,17 @@ def save_config(cfg: dict):
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
     tmp_path = path + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2)
+    # Serialize up front so the file is written with a single write() call.
+    if orjson is not None:
+        data = orjson.dumps(cfg, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    else:
+        data = (json.dumps(cfg, indent=2) + "\n").encode("utf-8")
+    with open(tmp_path, "wb", opener=_private_opener) as f:
+        f.write(data)
 
     # Restrict permissions (best-effort; on Windows this may not behave the same)
     try:
-        os.chmod(tmp_path, 0o600)
+        _restrict_permissions(tmp_path)
     except Exception as e:
         print("Not able to save config", e)
         print("Won't be loading current config on new session....")
@@ -91,19 +121,11 @@ def set_env_from_config(cfg: dict) -> bool:
     """
     loaded_any = False
 
-    openai = (cfg.get("openai_key") or "").strip()
-    anthropic = (cfg.get("anthropic_key") or "").strip()
-    gemini = (cfg.get("gemini_key") or "").strip()
-
-    if openai:
-        os.environ["OPENAI_API_KEY"] = openai
-        loaded_any = True
-    if anthropic:
-        os.environ["ANTHROPIC_API_KEY"] = anthropic
-        loaded_any = True
-    if gemini:
-        os.environ["GOOGLE_API_KEY"] = gemini
-        loaded_any = True
+    for cfg_key, env_key in _KEY_MAP:
+        value = (cfg.get(cfg_key) or "").strip()
+        if value:
+            os.environ[env_key] = value
+            loaded_any = True
 
     return loaded_any
 
@@ -115,18 +137,10 @@ def update_config_from_env(cfg: dict) -> bool:
     """
     changed = False
 
-    env_openai = os.environ.get("OPENAI_API_KEY", "").strip()
-    env_anthropic = os.environ.get("ANTHROPIC_API_KEY", "").strip()
-    env_gemini = os.environ.get("GOOGLE_API_KEY", "").strip()
-
-    if env_openai and cfg.get("openai_key") != env_openai:
-        cfg["openai_key"] = env_openai
-        changed = True
-    if env_anthropic and cfg.get("anthropic_key") != env_anthropic:
-        cfg["anthropic_key"] = env_anthropic
-        changed = True
-    if env_gemini and cfg.get("gemini_key") != env_gemini:
-        cfg["gemini_key"] = env_gemini
-        changed = True
+    for cfg_key, env_key in _KEY_MAP:
+        value = os.environ.get(env_key, "").strip()
+        if value and cfg.get(cfg_key) != value:
+            cfg[cfg_key] = value
+            changed = True
 
     return changed
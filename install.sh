@@ -71,7 +71,7 @@ python3 -m venv "$INSTALL_DIR/venv"
 # 4. Install Dependencies
 echo "📦 Installing libraries..."
 "$INSTALL_DIR/venv/bin/pip" install --upgrade pip > /dev/null
-"$INSTALL_DIR/venv/bin/pip" install openai google-generativeai anthropic > /dev/null
+"$INSTALL_DIR/venv/bin/pip" install openai google-generativeai anthropic orjson > /dev/null
 
 # 5. Create the Launcher
 echo "🔗 Creating launcher script..."
@@ -1,52 +1,169 @@
 import os
 import sys
+import select
 import selectors
 import errno
 
-def start_io_loop(pty_fd):
+from winsize import set_pty_size
+
+# Keystrokes arrive a few bytes at a time; program output can come in bursts.
+_STDIN_BUF = 4096
+_IO_BUF = 65536
+# Upper bound on one coalesced PTY batch, so a flood (e.g. `yes`) can't starve stdin.
+_MAX_BATCH = 1 << 20
+
+
+def _drain(fd):
+    """
+    Reads everything already queued on a non-blocking fd, up to _MAX_BATCH.
+    Returns (data, pending). data is None on a spurious wake-up and b"" once the
+    other end is closed. pending is True when the fd must be read again without
+    waiting for it: the batch was capped, or a close is still to be reported.
+    An edge-triggered fd won't wake the loop for either.
+    """
+    try:
+        data = os.read(fd, _IO_BUF)
+    except BlockingIOError:
+        return None, False
+    if not data:
+        return data, False
+
+    # Read until EAGAIN: a PTY master hands out at most ~4 KB per read even when
+    # more is queued, so a short read doesn't mean the queue is empty.
+    buf = bytearray(data)
+    while len(buf) < _MAX_BATCH:
+        try:
+            more = os.read(fd, _IO_BUF)
+        except BlockingIOError:
+            return buf, False
+        except OSError as e:
+            if e.errno == errno.EIO:
+                # Hand over what we have; the next read reports the close.
+                return buf, True
+            raise
+        if not more:
+            return buf, True
+        buf += more
+    return buf, True
+
+
+def _write_all(fd, data):
+    """
+    Writes all of data, waiting for the fd to become writable if it is non-blocking.
+    """
+    view = memoryview(data)
+    while view:
+        try:
+            n = os.write(fd, view)
+        except BlockingIOError:
+            select.select([], [fd], [])
+            continue
+        view = view[n:]
+
+
+def _clear_pipe(fd):
+    """Empties a non-blocking notification pipe."""
+    try:
+        while os.read(fd, _STDIN_BUF):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def start_io_loop(pty_fd, winch_fd=None):
     """
     Forwards data between Standard I/O and the PTY.
+    winch_fd is the read end of the SIGWINCH self-pipe from setup_signals().
     """
-    sel = selectors.DefaultSelector()
+    stdin_fd = sys.stdin.fileno()
+    stdout_fd = sys.stdout.fileno()
+    # Set when the PTY must be read again before waiting (see _drain).
+    pty_more = False
+
+    # Non-blocking so each wake-up can drain the PTY without stalling.
+    os.set_blocking(pty_fd, False)
+
+    def on_stdin():
+        # User typed something
+        data = os.read(stdin_fd, _STDIN_BUF)
+        if not data: # EOF (Ctrl+D)
+            return False
+        _write_all(pty_fd, data)
+        return True
+
+    def on_pty():
+        # PTY outputted something; take everything queued
+        # so a burst reaches the screen in one write.
+        nonlocal pty_more
+        data, pty_more = _drain(pty_fd)
+        if data is None:
+            return True
+        if not data: # PTY closed
+            return False
+        _write_all(stdout_fd, data)
+        sys.stdout.flush()
+        return True
+
+    def on_winch():
+        # Terminal resized; however many signals are queued,
+        # resize the PTY once.
+        _clear_pipe(winch_fd)
+        set_pty_size(pty_fd)
+        return True
+
+    handlers = {stdin_fd: on_stdin, pty_fd: on_pty}
+    if winch_fd is not None:
+        handlers[winch_fd] = on_winch
 
-    # Register Standard Input (Keyboard) -> PTY
-    sel.register(sys.stdin, selectors.EVENT_READ)
+    if hasattr(select, "epoll"):
+        # Linux: register once. The PTY and resize pipe are edge-triggered and
+        # drained on every wake-up; stdin stays level-triggered and blocking,
+        # since it is shared with the parent terminal.
+        ep = select.epoll()
+        for fd in handlers:
+            ep.register(fd, select.EPOLLIN if fd == stdin_fd else select.EPOLLIN | select.EPOLLET)
 
-    # Register PTY Output -> Standard Output (Screen)
-    sel.register(pty_fd, selectors.EVENT_READ)
+        def wait(timeout):
+            return [fd for fd, _ in ep.poll(timeout)]
+
+        close = ep.close
+    else:
+        sel = selectors.DefaultSelector()
+        for fd in handlers:
+            sel.register(fd, selectors.EVENT_READ)
+
+        def wait(timeout):
+            return [key.fd for key, _ in sel.select(None if timeout < 0 else timeout)]
+
+        close = sel.close
 
     running = True
-    while running:
-        try:
-            events = sel.select()
-            for key, _ in events:
-                try:
-                    if key.fileobj == sys.stdin:
-                        # User typed something
-                        data = os.read(sys.stdin.fileno(), 1024)
-                        if not data: # EOF (Ctrl+D)
+    try:
+        while running:
+            try:
+                # An edge won't fire again for output left behind by a capped
+                # batch or for a pending close, so poll without blocking and
+                # read the PTY regardless.
+                ready = wait(0 if pty_more else -1)
+                if pty_more and pty_fd not in ready:
+                    ready.append(pty_fd)
+                for fd in ready:
+                    try:
+                        if not handlers[fd]():
                             running = False
                             break
-                        os.write(pty_fd, data)
 
-                    else:
-                        # PTY outputted something
-                        data = os.read(pty_fd, 1024)
-                        if not data: # PTY closed
+                    except OSError as e:
+                        if e.errno == errno.EIO:
+                            # Input/Output error usually means PTY closed
                             running = False
-                            break
-                        os.write(sys.stdout.fileno(), data)
-                        sys.stdout.flush()
-
-                except OSError as e:
-                    if e.errno == errno.EIO:
-                        # Input/Output error usually means PTY closed
-                        running = False
-                    else:
-                        raise e
-
-        except KeyboardInterrupt:
-            # Pass Ctrl+C to PTY, don't kill Python script
-            # In raw mode, the PTY handles the signal usually,
-            # but this catches edge cases.
-            pass
+                        else:
+                            raise e
+
+            except KeyboardInterrupt:
+                # Pass Ctrl+C to PTY, don't kill Python script
+                # In raw mode, the PTY handles the signal usually,
+                # but this catches edge cases.
+                pass
+    finally:
+        close()
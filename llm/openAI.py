@@ -1,38 +1,52 @@
+import asyncio
+import functools
+import hashlib
 import json
 import os
 import re
+import select
 import shlex
+import signal
+import stat
 import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import platform
-from openai import OpenAI
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
+try:
+    # google-re2 matches in linear time, so hostile model output can't make the
+    # safety guards backtrack. Optional; stdlib re is the fallback.
+    import re2 as _guard_re
+except ImportError:
+    _guard_re = re
 
 SYSTEM_PROMPT = """
 You are an AI File-Aware Developer Platform Bash Decision Agent for All Operating Systems.
 
 Analyze USER_INPUT and return a SINGLE valid JSON object. NO markdown, explanations, or comments.
 
---------------------------------
 JSON SCHEMA
---------------------------------
 {
   "action": "INSPECT" | "EXECUTE" | "REVIEW" | "ASK" | "UPLOAD" | "BLOCK",
   "commands": [string],
   "reason": string | null
 }
 
---------------------------------
 ACTIONS
---------------------------------
 
 INSPECT (reason = null)
-  INSPECT (internal-only) : 
+  INSPECT (internal-only) :
     Used ONLY when the agent must gather missing system state before it can safely respond.
     INSPECT is NEVER used to fulfill a user request directly.
     If the user explicitly asks to run a read-only command (ls, cat, docker ps, etc.),
     that is EXECUTE, not INSPECT.
-    INSPECT is for: 
+    INSPECT is for:
         verifying tool existence before install
         checking environment before deployment
         confirming file presence before modification
@@ -47,7 +61,7 @@ EXECUTE (reason = null)
 
 REVIEW (reason = required)
   Destructive/impactful operations requiring user confirmation.
-  Includes: rm -rf, service restart, cloud ops (terraform apply, kubectl delete), 
+  Includes: rm -rf, service restart, cloud ops (terraform apply, kubectl delete),
   DB mutations (DROP, DELETE), sudo, bulk operations
   reason must explain risk + suggest rollback if applicable
 
@@ -65,9 +79,7 @@ UPLOAD (commands = file paths only, reason = required)
 BLOCK (commands = [], reason = "Action blocked")
   Clearly unsafe: accessing secrets, malware, privilege exploits, data exfiltration
 
---------------------------------
 CRITICAL RULES
---------------------------------
 1. Return EXACTLY one JSON object per response
 2. NEVER mix action types (no INSPECT + EXECUTE)
 3. NEVER use sudo without explicit user request
@@ -81,9 +93,7 @@ FILES: INSPECT existence before UPLOAD. Paths must be explicit and singular.
 PYTHON: Never inline >3 lines with `python -c`. Create .py file instead.
 WRITING: Use printf per line OR temp file. Preserve indentation.
 
---------------------------------
 DECISION FLOW
---------------------------------
 1. Destructive/unsafe? → BLOCK
 2. Missing critical info? → ASK
 3. Need file content analysis? → UPLOAD
@@ -96,20 +106,16 @@ Keywords: "delete/destroy/kill" → likely REVIEW/BLOCK
          "install/run/build" → likely EXECUTE (if safe) or REVIEW
          "why/debug/analyze file" → likely UPLOAD
 
---------------------------------
 MULTI-STEP FILE FLOW
---------------------------------
 1. Request analysis → UPLOAD with paths
 2. System provides file_ids
 3. Analyze using file_ids (NEVER re-request same files)
 4. Continue with INSPECT/EXECUTE/REVIEW as needed
 
---------------------------------
 TOOLING (VERSION MANAGERS FIRST)
---------------------------------
 JAVA/JVM: Use SDKMAN. Check: command -v sdk. Install: curl -s "https://get.sdkman.io" | bash
   Tools: Java, Gradle, Maven, Kotlin, Scala
-  
+
 PYTHON: Use venv/virtualenv. Check: command -v python3. Prefer pip in venv.
   Never modify system Python without explicit request.
 
@@ -130,9 +136,7 @@ GIT: status/log → INSPECT. commit/push → EXECUTE. force-push/rebase → REVI
 DATABASE: SELECT → EXECUTE. INSERT/UPDATE → EXECUTE (dev) or REVIEW (prod).
   DROP/DELETE/TRUNCATE → REVIEW always
 
---------------------------------
 EDGE CASES
---------------------------------
 "Install X" without version → ASK for version if choice matters, else use latest
 "Deploy" without env → ASK which environment
 "Delete all" → REVIEW with scope, suggest backup
@@ -143,9 +147,7 @@ Large operations → REVIEW with count/scope
 Ambiguous file refs → ASK for explicit path
 Interactive commands (vim, top) → EXECUTE if clearly intended, else ASK
 
---------------------------------
 PLATFORM HANDLING
---------------------------------
 Detect OS if needed: uname -s
 Portable commands preferred. Handle Linux/macOS differences:
   stat: Use stat -c (Linux) or stat -f (macOS) - detect first
@@ -153,27 +155,21 @@ Portable commands preferred. Handle Linux/macOS differences:
 Check disk space before large ops: df -h
 Check resources if intensive: free -h, top
 
---------------------------------
 SECURITY
---------------------------------
 Never upload/expose: SSH keys, .env, credentials, AWS keys, tokens
 Validate paths before rm/mv/dangerous ops
 Use secure permissions: chmod 600 for sensitive files
 Environment vars for secrets, not CLI args
 Sanitize user input in commands
 
---------------------------------
 ERROR HANDLING
---------------------------------
 Check exit codes for critical ops: || exit 1
 Use set -e in scripts (exit on error)
 Meaningful errors to stderr: echo "Error: ..." >&2
 Clean temp resources on failure: trap cleanup
 Log appropriately (stdout vs stderr)
 
---------------------------------
 VALIDATION CHECKLIST
---------------------------------
 ✓ Valid JSON (no markdown, no text outside JSON)
 ✓ action is valid enum value
 ✓ commands matches action (empty for ASK/BLOCK, paths only for UPLOAD)
@@ -182,9 +178,7 @@ VALIDATION CHECKLIST
 ✓ Commands are complete and executable
 ✓ Security rules respected
 
---------------------------------
 EXAMPLES
---------------------------------
 
 USER: "Check if Docker is running"
 {"action": "INSPECT", "commands": ["docker ps"], "reason": null}
@@ -215,9 +209,7 @@ USER: "Why is app slow? Check logs"
 First: {"action": "INSPECT", "commands": ["tail -n 100 /var/log/app.log"], "reason": null}
 If insufficient: {"action": "UPLOAD", "commands": ["/var/log/app.log"], "reason": "Need full log analysis to identify performance bottlenecks"}
 
---------------------------------
 REMEMBER
---------------------------------
 - Be deterministic and explicit
 - Safety > convenience
 - INSPECT before assuming
@@ -230,11 +222,10 @@ REMEMBER
 - If resolved path is '/', BLOCK immediately.
 - Treat '.', './', '../', or empty paths as UNKNOWN until inspected.
 """.strip()
-client = OpenAI(
-    api_key=os.environ["OPENAI_API_KEY"]
-)
-
 DEFAULT_MODEL = os.environ.get("OPENAI_MODEL", "gpt-5-nano")
+# Routes requests sharing the SYSTEM_PROMPT prefix to the same server-side prompt
+# cache. Bump the suffix whenever SYSTEM_PROMPT changes.
+PROMPT_CACHE_KEY = "thinkshell-sys-v2"
 
 # ---------------- Runtime Guard ---------------- #
 
@@ -263,20 +254,88 @@ SENSITIVE_UPLOAD_PATTERNS = [
     r"id_ed25519$",
 ]
 
+# Each list is fused into one alternation so a command is scanned once, not per pattern.
+_FORBIDDEN_RE = _guard_re.compile("|".join(f"(?:{p})" for p in FORBIDDEN_PATTERNS))
+_SENSITIVE_UPLOAD_RE = _guard_re.compile("|".join(f"(?:{p})" for p in SENSITIVE_UPLOAD_PATTERNS))
+
+# One client per process so every step reuses the SDK's pooled HTTP connections.
+_CLIENT = None
+
 MAX_UPLOAD_FILES = 10
 MAX_UPLOAD_BYTES_PER_FILE = 250_000  # keep prompts small-ish
+UPLOAD_SAMPLE_BYTES = 120_000  # head/tail window kept from oversized files
+COMMAND_TIMEOUT = 10  # seconds
+COMMAND_OUTPUT_CHARS = 4000  # output kept per command
+COMMAND_READ_BYTES = 16_384  # output buffered per command; the rest is read and discarded
+INSPECT_SUMMARY_CHARS = 200  # per-command output kept once a newer INSPECT result arrives
+INSPECT_CACHE_TTL = 30  # seconds an INSPECT output is reused across invocations
+MAX_CONTEXT_TOKENS = 60_000  # older uploads are dropped from the history beyond this
+# EXECUTE commands get their own process group, so a timeout can kill the whole
+# group, but stay in the session so /dev/tty prompts (sudo, ssh, git) still work.
+_OWN_PGROUP = {"process_group": 0} if sys.version_info >= (3, 11) else {"preexec_fn": os.setpgrp}
+
+
+@functools.lru_cache(maxsize=1)
+def _os_info() -> dict:
+    # Deferred: platform.processor() shells out to `uname -p` on Linux.
+    import platform
+
+    return {
+        "OSName": platform.system(),
+        "OSVersion": platform.version(),
+        "Release": platform.release(),
+        "Machine": platform.machine(),
+        "Processor": platform.processor()
+    }
+
+
+def _json_loads(s):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def _json_dumps(obj) -> str:
+    # orjson never escapes non-ASCII, matching json.dumps(..., ensure_ascii=False).
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+# Tokens made only of these characters need no quoting; skips shlex.quote's work.
+_SAFE_TOKEN = re.compile(r"[A-Za-z0-9_@%+=:,./-]+\Z")
+_PRINTF_LINE = "printf '%s\\n' "
+_PRINTF_ITEM = "printf '  %s\\n' "
+# printf_block/cmd_block are pre-joined, each line prefixed with "\n".
+_REVIEW_TEMPLATE = (
+    "{reason_line}\n"
+    "printf '%s\\n' 'Proposed commands:'{printf_block}\n"
+    "read -r -p 'Proceed? [y/N] ' TS_PROCEED\n"
+    'case "$TS_PROCEED" in\n'
+    "  y|Y|yes|YES)\n"
+    "    set -e{cmd_block}\n"
+    "    ;;\n"
+    "  *) echo 'Aborted.' ;;\n"
+    "esac"
+)
 
-OS_INFO = {
-    "OSName": platform.system(),
-    "OSVersion": platform.version(),
-    "Release": platform.release(),
-    "Machine": platform.machine(),
-    "Processor": platform.processor()
-}
+
+@functools.lru_cache(maxsize=1)
+def _init_messages() -> tuple[dict, dict]:
+    # The SYSTEM_PROMPT and OS_INFO messages are the same for every request; build
+    # them once. They are shared, so the agent loop must never mutate them.
+    return (
+        {"role": "system", "content": SYSTEM_PROMPT},
+        # Rendered as sorted JSON rather than a dict repr so the bytes are stable
+        # across runs and Python versions, keeping the prompt prefix cacheable.
+        {"role": "system", "content": "OS_INFO: " + json.dumps(_os_info(), sort_keys=True)},
+    )
 
 
+@functools.lru_cache(maxsize=512)
 def _bash_quote(s: str) -> str:
-    return shlex.quote(s)
+    # Memoized: retries tend to re-send the same commands and reason text.
+    return s if _SAFE_TOKEN.match(s) else shlex.quote(s)
 
 
 def _get_openai_key() -> str | None:
@@ -286,18 +345,12 @@ def _get_openai_key() -> str | None:
 
 def is_runtime_safe(cmd: str) -> bool:
     """Hard safety gate: no reasoning, just block known foot-guns."""
-    for pattern in FORBIDDEN_PATTERNS:
-        if re.search(pattern, cmd):
-            return False
-    return True
+    return _FORBIDDEN_RE.search(cmd) is None
 
 
 def _is_sensitive_upload_path(p: str) -> bool:
     norm = p.replace("\\", "/")
-    for pat in SENSITIVE_UPLOAD_PATTERNS:
-        if re.search(pat, norm):
-            return True
-    return False
+    return _SENSITIVE_UPLOAD_RE.search(norm) is not None
 
 
 def _read_upload_file(path: str) -> dict:
@@ -305,30 +358,32 @@ def _read_upload_file(path: str) -> dict:
     if _is_sensitive_upload_path(path):
         return {"error": "Blocked: path looks sensitive (.ssh/.env/keys)."}
 
+    # One stat answers existence, type and size.
     p = Path(path).expanduser()
     try:
-        rp = p.resolve()
-    except Exception:
-        rp = p
-
-    if not p.exists():
+        st = os.stat(p)
+    except FileNotFoundError:
         return {"error": "Not found."}
+    except Exception as e:
+        return {"error": f"Could not stat file: {e}"}
 
-    if p.is_dir():
+    if stat.S_ISDIR(st.st_mode):
         return {"error": "Is a directory; provide an explicit file path."}
 
-    try:
-        size = p.stat().st_size
-    except Exception as e:
-        return {"error": f"Could not stat file: {e}"}
+    if not stat.S_ISREG(st.st_mode):
+        return {"error": "Not a regular file."}
+
+    size = st.st_size
 
     if size > MAX_UPLOAD_BYTES_PER_FILE:
-        # Read a head+tail sample rather than failing hard.
+        # Read a head+tail sample rather than failing hard. Seek to the tail so only
+        # the two windows are read, however large the file is.
         try:
-            data = p.read_bytes()
-            head = data[:120_000]
-            tail = data[-120_000:] if len(data) > 120_000 else b""
-            text = (head + (b"\n\n...TRUNCATED...\n\n" if tail else b"") + tail).decode("utf-8", errors="replace")
+            with open(p, "rb") as f:
+                head = f.read(UPLOAD_SAMPLE_BYTES)
+                f.seek(-UPLOAD_SAMPLE_BYTES, os.SEEK_END)
+                tail = f.read(UPLOAD_SAMPLE_BYTES)
+            text = (head + b"\n\n...TRUNCATED...\n\n" + tail).decode("utf-8", errors="replace")
             return {"size": size, "truncated": True, "content": text}
         except Exception as e:
             return {"error": f"Could not read file: {e}"}
@@ -344,33 +399,209 @@ def _read_upload_file(path: str) -> dict:
             return {"error": f"Could not read file: {e}"}
 
 
+def _command_result(cmd: str, buf: bytes, timed_out: bool) -> str:
+    out = buf.decode("utf-8", errors="replace").strip()
+    if timed_out:
+        # Keep whatever arrived; `cmd &` leaves the pipe open past the shell's exit.
+        error = f"ERROR: Command '{cmd}' timed out after {COMMAND_TIMEOUT} seconds"
+        out = f"{error}\n{out}" if out else error
+    return out[:COMMAND_OUTPUT_CHARS]
+
+
 def run_command(cmd: str) -> str:
-    # Used only for INSPECT steps (internal state gathering).
+    # Output is streamed and only the first COMMAND_READ_BYTES are kept, so a chatty
+    # command can't buffer unbounded output in memory. The command itself always
+    # runs to completion (or the timeout): EXECUTE commands change state.
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
             shell=True,
-            capture_output=True,
-            text=True,
-            timeout=10,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **_OWN_PGROUP,
         )
-        return (result.stdout + result.stderr).strip()[:4000]
     except Exception as e:
         return f"ERROR: {str(e)}"
 
+    buf = bytearray()
+    deadline = time.monotonic() + COMMAND_TIMEOUT
+    timed_out = False
+    try:
+        fd = proc.stdout.fileno()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                timed_out = True
+                break
+            chunk = os.read(fd, COMMAND_READ_BYTES)
+            if not chunk:
+                break
+            if len(buf) < COMMAND_READ_BYTES:
+                buf += chunk[:COMMAND_READ_BYTES - len(buf)]
+
+        if not timed_out:
+            try:
+                proc.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+    finally:
+        # Kill the whole group even if the shell itself has exited: a background
+        # child holding the pipe is what timed out.
+        if timed_out or proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        proc.stdout.close()
+        proc.wait()
+
+    return _command_result(cmd, buf, timed_out)
+
+
+async def _run_command_async(cmd: str) -> str:
+    # Async twin of run_command so a batch of INSPECT commands runs concurrently;
+    # same timeout, output cap and process-group kill on timeout.
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
+        )
+    except Exception as e:
+        return f"ERROR: {str(e)}"
 
-def call_llm(messages: list[dict]) -> dict:
-    key = _get_openai_key()
-    if not key:
-        raise RuntimeError("OPENAI_API_KEY not set")
+    buf = bytearray()
+
+    async def _read_capped():
+        while True:
+            chunk = await proc.stdout.read(COMMAND_READ_BYTES)
+            if not chunk:
+                break
+            if len(buf) < COMMAND_READ_BYTES:
+                buf.extend(chunk[:COMMAND_READ_BYTES - len(buf)])
+        await proc.wait()
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(_read_capped(), timeout=COMMAND_TIMEOUT)
+    except asyncio.TimeoutError:
+        timed_out = True
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+    finally:
+        if timed_out or proc.returncode is None:
+            # Kill the whole group even if the shell has exited: a background child
+            # holding the pipe is what timed out. communicate() then reads the pipe
+            # to EOF so the transport is closed before the event loop goes away.
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.communicate()
+    return _command_result(cmd, buf, timed_out)
+
+
+def _inspect_cache_path() -> str:
+    xdg = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(xdg, "thinkshell", "inspect_cache.json")
+
+
+# Shell environment that changes what INSPECT commands see (command -v, --version).
+_INSPECT_ENV_KEYS = ("PATH", "VIRTUAL_ENV", "CONDA_PREFIX")
+
+
+def _inspect_cache_scope() -> str:
+    """
+    Identifies where INSPECT output is valid: the working directory (ls, git status,
+    cat ./x) plus a digest of the calling shell's tool environment.
+    """
+    h = hashlib.sha256()
+    for key in _INSPECT_ENV_KEYS:
+        h.update(f"{key}={os.environ.get(key, '')}\0".encode("utf-8", errors="replace"))
+    # A tool installed by hand bumps the mtime of its PATH directory.
+    for d in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            h.update(str(os.stat(d).st_mtime_ns).encode())
+        except OSError:
+            pass
+        h.update(b"\0")
+    return f"{os.getcwd()}\0{h.hexdigest()}"
+
+
+def _inspect_cache_key(scope: str, cmd: str) -> str:
+    return f"{scope}\0{cmd}"
 
-    client = OpenAI(api_key=key)
-    response = client.chat.completions.create(
+
+def _load_inspect_cache() -> dict[str, list]:
+    """Return {key: [timestamp, output]} entries younger than INSPECT_CACHE_TTL."""
+    # noinspection PyBroadException
+    try:
+        with open(_inspect_cache_path(), "rb") as f:
+            entries = _json_loads(f.read())
+        now = time.time()
+        return {c: e for c, e in entries.items() if now - e[0] < INSPECT_CACHE_TTL}
+    except Exception:
+        # Missing or corrupt cache just means everything runs fresh.
+        return {}
+
+
+def _save_inspect_cache(entries: dict[str, list]):
+    # Best-effort; outputs may be sensitive, so the file is private to the user.
+    path = _inspect_cache_path()
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8", opener=lambda p, flags: os.open(p, flags, 0o600)) as f:
+            f.write(_json_dumps(entries))
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def _clear_inspect_cache():
+    # Called before anything that may change system state (EXECUTE/REVIEW), so the
+    # next query doesn't see outputs from before the change.
+    try:
+        os.remove(_inspect_cache_path())
+    except OSError:
+        pass
+
+
+def run_commands_concurrently(cmds: list[str]) -> list[str]:
+    """Run cmds in parallel; wall time is the slowest command, not the sum."""
+    async def _gather():
+        return await asyncio.gather(*(_run_command_async(c) for c in cmds))
+
+    return asyncio.run(_gather())
+
+
+def _get_client():
+    global _CLIENT
+    if _CLIENT is None:
+        key = _get_openai_key()
+        if not key:
+            raise RuntimeError("OPENAI_API_KEY not set")
+        from openai import OpenAI
+
+        _CLIENT = OpenAI(api_key=key)
+    return _CLIENT
+
+
+def call_llm(messages: list[dict]) -> dict:
+    response = _get_client().chat.completions.create(
         model=DEFAULT_MODEL,
         messages=messages,
         response_format={"type": "json_object"},
+        extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
     )
-    return json.loads(response.choices[0].message.content)
+    content = response.choices[0].message.content
+    if not content:
+        # e.g. a refusal; json/orjson would fail with an unhelpful TypeError on None.
+        raise RuntimeError("Model returned an empty response")
+    return _json_loads(content)
 
 
 def safe_echo(msg: str) -> str:
@@ -378,41 +609,34 @@ def safe_echo(msg: str) -> str:
 
 
 def normalize_commands(cmds) -> list[str]:
-    if not isinstance(cmds, list):
+    # Decoded JSON gives exact list/str types, so identity checks suffice.
+    if type(cmds) is not list:
         return []
-    return [c for c in cmds if isinstance(c, str) and c.strip()]
+    # Well-formed replies (the common case) are returned as-is, without a copy;
+    # isspace() tests blankness without allocating a stripped copy of each command.
+    if all(type(c) is str and c and not c.isspace() for c in cmds):
+        return cmds
+    return [c for c in cmds if type(c) is str and c and not c.isspace()]
 
 
 def _interactive_review_snippet(reason: str, commands: list[str]) -> str:
     # Build a bash snippet that prints context and asks the user before executing.
-    lines: list[str] = []
-    lines.append(f"printf '%s\\n' {_bash_quote('Review required: ' + (reason or 'Confirmation needed.'))}")
-    lines.append("printf '%s\\n' 'Proposed commands:'")
-    for cmd in commands:
-        lines.append(f"printf '  %s\\n' {_bash_quote(cmd)}")
-
-    # Safety gate again before emitting runnable code.
-    for cmd in commands:
-        if not is_runtime_safe(cmd):
-            return safe_echo("Execution blocked by runtime safety guard.")
-
-    lines.append("read -r -p 'Proceed? [y/N] ' TS_PROCEED")
-    lines.append("case \"$TS_PROCEED\" in")
-    lines.append("  y|Y|yes|YES)")
-    lines.append("    set -e")
-    for cmd in commands:
-        lines.append(f"    {cmd}")
-    lines.append("    ;;")
-    lines.append("  *) echo 'Aborted.' ;;")
-    lines.append("esac")
-    return "\n".join(lines)
+    # Safety gate again, before any of the snippet is built.
+    if not all(map(is_runtime_safe, commands)):
+        return safe_echo("Execution blocked by runtime safety guard.")
+
+    return _REVIEW_TEMPLATE.format(
+        reason_line=_PRINTF_LINE + _bash_quote("Review required: " + (reason or "Confirmation needed.")),
+        printf_block="".join("\n" + _PRINTF_ITEM + _bash_quote(cmd) for cmd in commands),
+        cmd_block="".join("\n    " + cmd for cmd in commands),
+    )
 
 
 def _interactive_ask_snippet(original_intent: str, question: str) -> str:
     # Ask one question, then re-call the controller with the answer appended.
     q = question or "Need more information."
     lines: list[str] = []
-    lines.append(f"printf '%s\\n' {_bash_quote(q)}")
+    lines.append(_PRINTF_LINE + _bash_quote(q))
     lines.append("read -r -p '> ' TS_ANSWER")
     lines.append(f"TS_FOLLOWUP={_bash_quote(original_intent)}")
     lines.append('TS_NEW_QUERY="$TS_FOLLOWUP\n\nUSER_ANSWER: $TS_ANSWER"')
@@ -421,21 +645,62 @@ def _interactive_ask_snippet(original_intent: str, question: str) -> str:
     return "\n".join(lines)
 
 
+def _approx_tokens(messages: list[dict]) -> int:
+    # ~4 characters per token is close enough for a budget check, without tiktoken.
+    return sum(len(m["content"]) for m in messages) // 4
+
+
+def _drop_old_uploads(
+    messages: list[dict],
+    upload_msgs: list[tuple[int, list[str]]],
+    uploaded_files: set[str],
+    upload_digests: dict[str, str],
+):
+    """
+    Stub out the oldest UPLOADED_FILES messages until the history fits MAX_CONTEXT_TOKENS.
+    The newest upload is always kept; dropped paths may be uploaded again.
+    """
+    while len(upload_msgs) > 1 and _approx_tokens(messages) > MAX_CONTEXT_TOKENS:
+        idx, paths = upload_msgs.pop(0)
+        stub = {p: {"dropped": "Content removed to save context; upload again if still needed."} for p in paths}
+        messages[idx]["content"] = f"UPLOADED_FILES: {_json_dumps(stub)}"
+        uploaded_files.difference_update(paths)
+        for digest in [d for d, p in upload_digests.items() if p in paths]:
+            del upload_digests[digest]
+
+
+_STALLED_MESSAGE = "Agent stopped: it kept repeating steps that produced no new information."
+
+
 def ai_terminal(user_input: str) -> str:
     """Return bash code that the shell will eval."""
     messages: list[dict] = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "system", "content": f"OS_INFO: {OS_INFO}"},
+        *_init_messages(),
         {"role": "system", "content": f"ORIGINAL_INTENT: {user_input}"},
     ]
 
     MAX_STEPS = 12
     seen_inspects: set[str] = set()
     uploaded_files: set[str] = set()
+    # Index + outputs of the newest INSPECTION_RESULT message, the only one kept in full.
+    last_inspection: tuple[int, dict[str, str]] | None = None
+    # Each query is a fresh controller process, so INSPECT results are shared via disk,
+    # per working directory and environment.
+    inspect_cache: dict[str, list] | None = None
+    cache_scope = ""
+    # (message index, paths) of UPLOADED_FILES messages still holding file contents.
+    upload_msgs: list[tuple[int, list[str]]] = []
+    # sha256 of uploaded content -> first path it was sent under; catches the same
+    # file requested under another spelling (./a.py vs a.py, symlinks).
+    upload_digests: dict[str, str] = {}
+    # Consecutive steps that produced nothing new; past the limit another LLM call
+    # would just resend the same state.
+    MAX_STALLED_STEPS = 2
+    stalled_steps = 0
 
     for _ in range(MAX_STEPS):
         llm_response = call_llm(messages)
-        messages.append({"role": "assistant", "content": json.dumps(llm_response, ensure_ascii=False)})
+        messages.append({"role": "assistant", "content": _json_dumps(llm_response)})
 
         action = str(llm_response.get("action", "")).upper().strip()
         commands = normalize_commands(llm_response.get("commands", []))
@@ -443,49 +708,121 @@ def ai_terminal(user_input: str) -> str:
 
         if action == "INSPECT":
             inspection_output: dict[str, str] = {}
+            to_run: list[str] = []
+            blocked = False
             for cmd in commands:
+                if cmd in inspection_output:
+                    continue
                 if cmd in seen_inspects:
                     inspection_output[cmd] = "ERROR: repeated inspection detected"
                     continue
                 if not is_runtime_safe(cmd):
                     inspection_output[cmd] = "BLOCKED: runtime safety guard"
+                    blocked = True
                     continue
                 print(f"echo 'Inspecting command: {cmd}'")
-                inspection_output[cmd] = run_command(cmd)
+                inspection_output[cmd] = ""  # keep the model's command order
+                to_run.append(cmd)
                 seen_inspects.add(cmd)
 
+            if to_run:
+                if inspect_cache is None:
+                    inspect_cache = _load_inspect_cache()
+                    cache_scope = _inspect_cache_scope()
+                fresh: list[str] = []
+                for cmd in to_run:
+                    entry = inspect_cache.get(_inspect_cache_key(cache_scope, cmd))
+                    if entry is not None:
+                        inspection_output[cmd] = entry[1]
+                    else:
+                        fresh.append(cmd)
+
+                if fresh:
+                    now = time.time()
+                    for cmd, output in zip(fresh, run_commands_concurrently(fresh)):
+                        inspection_output[cmd] = output
+                        if not output.startswith("ERROR:"):
+                            inspect_cache[_inspect_cache_key(cache_scope, cmd)] = [now, output]
+                    _save_inspect_cache(inspect_cache)
+
+            # Only repeats (or nothing) is a stall; a guard block is news to the model.
+            stalled_steps = 0 if to_run or blocked else stalled_steps + 1
+            if stalled_steps >= MAX_STALLED_STEPS:
+                return safe_echo(_STALLED_MESSAGE)
+
+            # The whole history is resent every step, so shrink the previous result
+            # to a short excerpt per command instead of letting the prompt grow.
+            if last_inspection is not None:
+                idx, previous = last_inspection
+                summary = {c: out[:INSPECT_SUMMARY_CHARS] for c, out in previous.items()}
+                messages[idx]["content"] = f"INSPECTION_RESULT: {_json_dumps(summary)}"
+
+            last_inspection = (len(messages), inspection_output)
             messages.append(
-                {"role": "system", "content": f"INSPECTION_RESULT: {json.dumps(inspection_output, ensure_ascii=False)}"}
+                {"role": "system", "content": f"INSPECTION_RESULT: {_json_dumps(inspection_output)}"}
             )
             continue
 
         if action == "UPLOAD":
-            payload: dict[str, dict] = {}
+            to_read: list[str] = []
             for path in commands[:MAX_UPLOAD_FILES]:
                 if path in uploaded_files:
                     continue
-                payload[path] = _read_upload_file(path)
+                print(f"echo 'Uploading file {path}'")
+                to_read.append(path)
                 uploaded_files.add(path)
-            print(f"echo 'Uploading file {path}'")
+
+            # File reads release the GIL, so a few threads overlap the I/O.
+            payload: dict[str, dict] = {}
+            if to_read:
+                with ThreadPoolExecutor(max_workers=len(to_read)) as pool:
+                    payload = dict(zip(to_read, pool.map(_read_upload_file, to_read)))
+
+            for path, result in payload.items():
+                if "content" not in result:
+                    continue
+                digest = hashlib.sha256(result["content"].encode("utf-8", errors="replace")).hexdigest()
+                if digest in upload_digests:
+                    payload[path] = {"duplicate_of": upload_digests[digest]}
+                else:
+                    upload_digests[digest] = path
+            if not payload:
+                stalled_steps += 1
+                if stalled_steps >= MAX_STALLED_STEPS:
+                    return safe_echo(_STALLED_MESSAGE)
+                messages.append(
+                    {"role": "system", "content": "NO_NEW_FILES: Every requested file was already provided above."}
+                )
+                continue
+
+            stalled_steps = 0
+            upload_msgs.append((len(messages), list(payload)))
             messages.append(
-                {"role": "system", "content": f"UPLOADED_FILES: {json.dumps(payload, ensure_ascii=False)}"}
+                {"role": "system", "content": f"UPLOADED_FILES: {_json_dumps(payload)}"}
             )
+            # Budget by size, not message count: a single upload can outweigh many steps.
+            _drop_old_uploads(messages, upload_msgs, uploaded_files, upload_digests)
             continue
 
         if action == "ASK":
             return _interactive_ask_snippet(user_input, str(reason or ""))
 
         if action == "REVIEW":
+            _clear_inspect_cache()
             return _interactive_review_snippet(str(reason or ""), commands)
 
         if action == "EXECUTE":
+            # Vet the whole batch first so an unsafe command late in the list can't
+            # leave the earlier ones already executed.
+            unsafe = next((cmd for cmd in commands if not is_runtime_safe(cmd)), None)
+            if unsafe is not None:
+                return safe_echo("Execution blocked by runtime safety guard, for command : " + unsafe)
+
+            _clear_inspect_cache()
             result = []
             for cmd in commands:
-                if not is_runtime_safe(cmd):
-                    return safe_echo("Execution blocked by runtime safety guard, for command : " + cmd)
-                else:
-                    print(f"echo 'Executing command : {cmd}'")
-                    result.append(run_command(cmd))
+                print(f"echo 'Executing command : {cmd}'")
+                result.append(run_command(cmd))
             # Execute in the user's shell so stateful operations (cd/export) work.
             return "\n".join(result) if commands else safe_echo("No commands provided.")
 
@@ -1,7 +1,5 @@
 import os
 
-from llm.openAI import ai_terminal
-
 
 def get_bash_command(user_query):
     """
@@ -10,6 +8,8 @@ def get_bash_command(user_query):
     # --- 1. OpenAI ---
     if os.environ.get("OPENAI_API_KEY"):
         try:
+            # Imported here so other providers don't pay for loading the OpenAI agent.
+            from llm.openAI import ai_terminal
             return ai_terminal(user_query)
         except ImportError:
             return "echo ' Error: pip install openai'"
@@ -18,12 +18,7 @@ def get_bash_command(user_query):
 
     # --- 2. Google Gemini ---
     elif os.environ.get("GOOGLE_API_KEY"):
-        try:
-            return "echo 'Google support pending upgrade...'"
-        except ImportError:
-            return "echo ' Error: pip install google-generativeai'"
-        except Exception as e:
-            return f"echo ' Gemini Error: {str(e)}'"
+        return "echo 'Google support pending upgrade...'"
 
     # --- 3. Anthropic Claude ---
     elif os.environ.get("ANTHROPIC_API_KEY"):
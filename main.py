@@ -1,20 +1,30 @@
 import argparse
 import atexit
+import copy
 import getpass
 import os
 import sys
 import termios
+import tty
 
 from aiproviders import get_available_providers_from_config
 from aiproviders import provider_selection_menu
 from configreader import load_config
 from configreader import save_config
-from io_loop import start_io_loop
-from pty_shell import spawn_shell
-from signals import setup_signals
-from winsize import set_pty_size
 from aiproviders import PROVIDERS
 
+# Raw-mode flag masks for set_manual_raw, computed once.
+_IFLAG_CLR = (termios.IGNBRK | termios.BRKINT | termios.PARMRK |
+              termios.ISTRIP | termios.INLCR | termios.IGNCR |
+              termios.ICRNL | termios.IXON)
+_LFLAG_CLR = termios.ECHO | termios.ICANON | termios.IEXTEN | termios.ISIG
+_VMIN = termios.VMIN
+_VTIME = termios.VTIME
+
+# Provider env vars, and provider -> (env_key, cfg_key), derived once from PROVIDERS.
+_ENV_KEYS_TO_CLEAR = tuple(m["env_key"] for m in PROVIDERS.values() if m["env_key"])
+_PROV_META = {p: (m["env_key"], m["cfg_key"]) for p, m in PROVIDERS.items()}
+
 
 def prompt_for_key(provider: str) -> str:
     meta = PROVIDERS[provider]
@@ -26,44 +36,49 @@ def apply_provider_env(cfg: dict, provider: str):
     Set only the chosen provider key into environment (clears others to avoid ambiguity).
     """
     # Clear all provider env vars first
-    for p, meta in PROVIDERS.items():
-        if meta["env_key"]:
-            os.environ.pop(meta["env_key"], None)
+    for env_key in _ENV_KEYS_TO_CLEAR:
+        os.environ.pop(env_key, None)
 
     if provider == "none":
         return
 
-    meta = PROVIDERS[provider]
-    key = (cfg.get(meta["cfg_key"]) or "").strip()
+    env_key, cfg_key = _PROV_META[provider]
+    key = (cfg.get(cfg_key) or "").strip()
     if key:
-        os.environ[meta["env_key"]] = key
+        os.environ[env_key] = key
 
 
-def ensure_provider_has_key(cfg: dict, provider: str):
+def ensure_provider_has_key(cfg: dict, provider: str) -> bool:
     """
-    If provider requires a key and config doesn't have it, prompt user and save.
+    If provider requires a key and config doesn't have it, prompt user.
+    Only updates cfg; returns True if it changed and needs saving.
     """
     if provider == "none":
-        return
+        return False
 
     meta = PROVIDERS[provider]
     cfg_key = meta["cfg_key"]
     existing = (cfg.get(cfg_key) or "").strip()
     if existing:
-        return
+        return False
+
+    # No one to prompt (scripted launch): don't block on getpass.
+    if not sys.stdin.isatty():
+        print("No key found and stdin is not a terminal. Starting without AI.")
+        cfg["provider"] = "none"
+        return True
 
     key = prompt_for_key(provider)
     if not key:
         print("No key entered. Starting without AI.")
         cfg["provider"] = "none"
-        save_config(cfg)
-        return
+        return True
 
     cfg[cfg_key] = key
-    save_config(cfg)
+    return True
 
 
-def choose_provider_on_startup(cfg: dict, cli_provider: str | None, switch_ai: bool) -> str:
+def choose_provider_on_startup(cfg: dict, cli_provider: str | None, switch_ai: bool) -> tuple[str, bool]:
     """
     Startup decision rules:
     - If cli_provider provided => use it (validate key)
@@ -71,6 +86,9 @@ def choose_provider_on_startup(cfg: dict, cli_provider: str | None, switch_ai: b
     - else if multiple keys exist in cfg => ask which model to use
     - else if exactly one key exists => auto-select that provider
     - else => ask setup menu
+
+    Returns (provider, dirty); cfg is only updated in memory, so the caller
+    saves once when dirty is True.
     """
     available = get_available_providers_from_config(cfg)
 
@@ -78,70 +96,76 @@ def choose_provider_on_startup(cfg: dict, cli_provider: str | None, switch_ai: b
     if switch_ai:
         provider = provider_selection_menu(title="ThinkShell AI Model Switch")
         cfg["provider"] = provider
-        save_config(cfg)
         ensure_provider_has_key(cfg, provider)
-        return provider
+        return provider, True
 
     # CLI provider wins
     if cli_provider:
         provider = cli_provider
         cfg["provider"] = provider
-        save_config(cfg)
         ensure_provider_has_key(cfg, provider)
-        return provider
+        return provider, True
 
     # Config provider next
     cfg_provider = (cfg.get("provider") or "").strip().lower()
     if cfg_provider in PROVIDERS:
         provider = cfg_provider
-        ensure_provider_has_key(cfg, provider)
-        return provider
+        dirty = ensure_provider_has_key(cfg, provider)
+        return provider, dirty
 
     # Multiple keys found -> ask user
     if len(available) >= 2:
         print("\nMultiple AI providers detected in config.")
         provider = provider_selection_menu(title="Select AI Provider to Use")
         cfg["provider"] = provider
-        save_config(cfg)
         ensure_provider_has_key(cfg, provider)
-        return provider
+        return provider, True
 
     # Exactly one key -> choose it
     if len(available) == 1:
         provider = available[0]
         cfg["provider"] = provider
-        save_config(cfg)
-        return provider
+        return provider, True
 
     # No keys -> run full setup menu
     provider = provider_selection_menu()
     cfg["provider"] = provider
-    save_config(cfg)
     ensure_provider_has_key(cfg, provider)
-    return provider
-
-
-def set_manual_raw(fd):
-    """Sets precise raw mode flags to fix cursor/space issues."""
-    attrs = termios.tcgetattr(fd)
-    attrs[0] &= ~(termios.IGNBRK | termios.BRKINT | termios.PARMRK |
-                  termios.ISTRIP | termios.INLCR | termios.IGNCR |
-                  termios.ICRNL | termios.IXON)
-    attrs[1] &= ~termios.OPOST
-    attrs[2] |= termios.CS8
-    attrs[3] &= ~(termios.ECHO | termios.ICANON |
-                  termios.IEXTEN | termios.ISIG)
-    attrs[6][termios.VMIN] = 1
-    attrs[6][termios.VTIME] = 0
-    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return provider, True
+
+
+def set_manual_raw(fd, current):
+    """
+    Sets precise raw mode flags to fix cursor/space issues.
+    current is the terminal's tcgetattr() result; it is left untouched.
+    """
+    attrs = copy.deepcopy(current)
+    if hasattr(tty, "cfmakeraw"):
+        # Python 3.12+: stdlib port of cfmakeraw(3), sets VMIN=1/VTIME=0 too.
+        tty.cfmakeraw(attrs)
+    else:
+        attrs[0] &= ~_IFLAG_CLR
+        attrs[1] &= ~termios.OPOST
+        attrs[2] |= termios.CS8
+        attrs[3] &= ~_LFLAG_CLR
+        attrs[6][_VMIN] = 1
+        attrs[6][_VTIME] = 0
+    # Already raw (e.g. launched from another raw-mode program): leave it be.
+    if attrs != current:
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
 
 def restore(fd, attrs):
     # noinspection PyBroadException
-    try: termios.tcsetattr(fd, termios.TCSADRAIN, attrs)
+    # TCSANOW: don't block exit waiting for the output queue to drain.
+    try: termios.tcsetattr(fd, termios.TCSANOW, attrs)
     except: pass
 
 def interactive_setup(cfg: dict):
     """Shows a menu if no keys are provided via CLI."""
+    if not sys.stdin.isatty():
+        cfg["provider"] = "none"
+        return
+
     print("\n🤖 \033[1mThinkShell AI Setup\033[0m")
     print("--------------------------------")
     print("1. OpenAI (GPT-4o/3.5)")
@@ -205,18 +229,20 @@ def main():
 
     cfg = load_config()
 
-    # If user passed CLI keys, save them to config right away
+    # If user passed CLI keys, store them in config (saved below)
     if args.openai_key:
         cfg["openai_key"] = args.openai_key.strip()
     if args.anthropic_key:
         cfg["anthropic_key"] = args.anthropic_key.strip()
     if args.gemini_key:
         cfg["gemini_key"] = args.gemini_key.strip()
-    if any([args.openai_key, args.anthropic_key, args.gemini_key]):
-        save_config(cfg)
+    keys_from_cli = any([args.openai_key, args.anthropic_key, args.gemini_key])
 
     # Determine provider, enforce key if needed
-    provider = choose_provider_on_startup(cfg, args.provider, args.switch_ai)
+    provider, dirty = choose_provider_on_startup(cfg, args.provider, args.switch_ai)
+    # One write for everything startup changed
+    if dirty or keys_from_cli:
+        save_config(cfg)
     # Apply environment for chosen provider
     apply_provider_env(cfg, provider)
 
@@ -229,19 +255,34 @@ def main():
         print("Error: Not running in a terminal.", e)
         return
 
-    atexit.register(restore, fd, old_attrs)
+    # Safety net for exits that bypass the finally below; dropped once it has run.
+    def _restore_terminal():
+        restore(fd, old_attrs)
+
+    atexit.register(_restore_terminal)
+
+    # Terminal plumbing is only needed from here on; keep it off the path
+    # of the setup prompts above.
+    from io_loop import start_io_loop
+    from pty_shell import spawn_shell
+    from signals import setup_signals
+    from winsize import set_pty_size
 
+    error = None
     try:
         pid, pty_fd = spawn_shell()
         set_pty_size(pty_fd)
-        setup_signals(pty_fd)
-        set_manual_raw(fd)
-        start_io_loop(pty_fd)
+        winch_fd = setup_signals()
+        set_manual_raw(fd, old_attrs)
+        start_io_loop(pty_fd, winch_fd)
     except Exception as e:
-        restore(fd, old_attrs)
-        print(f"Error: {e}")
+        error = e
     finally:
-        restore(fd, old_attrs)
+        _restore_terminal()
+        atexit.unregister(_restore_terminal)
+
+    if error is not None:
+        print(f"Error: {error}")
 
 if __name__ == "__main__":
     main()
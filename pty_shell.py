@@ -1,60 +1,18 @@
+import functools
 import os
 import pty
 import sys
 import tempfile
 from pathlib import Path
 
-def get_controller_path():
-    """
-    Robustly finds the controller script.
-    Works in:
-    1. Dev mode (current dir)
-    2. Installed mode (~/.thinkshell)
-    3. Frozen/Binary mode
-    """
-    # 1. Get the directory containing THIS file (pty_shell.py)
-    # This is the most reliable anchor.
-    current_script_dir = Path(__file__).resolve().parent
-
-    # 2. Look for thinkshellctl.py in the same directory
-    candidate = current_script_dir / "thinkshellctl.py"
-
-    if candidate.exists():
-        return str(candidate)
+# Prefer a modern bash (Homebrew) over the system one; resolved once at import.
+_BASH_BIN = next(
+    (p for p in ("/opt/homebrew/bin/bash", "/usr/local/bin/bash", "/bin/bash") if os.path.exists(p)),
+    "/bin/bash",
+)
 
-    # 3. Fallback: Look in 'controller' subdirectory (Dev structure)
-    candidate = current_script_dir / "controller" / "thinkshellctl.py"
-    if candidate.exists():
-        return str(candidate)
-
-    # 4. Fallback: Current Working Directory (last resort)
-    cwd_candidate = Path.cwd() / "thinkshellctl.py"
-    if cwd_candidate.exists():
-        return str(cwd_candidate)
-
-    # If we are here, installation is broken.
-    # Return a path that will likely error out clearly
-    return str(current_script_dir / "thinkshellctl.py")
-
-def spawn_shell():
-    pid, fd = pty.fork()
-    if pid == 0:
-        try:
-            os.environ["TS_CTL"] = get_controller_path()
-            os.environ["TS_PY"] = sys.executable
-            rc_path = _create_bashrc()
-            # Try to find a modern bash first
-            bash_bin = "/bin/bash"
-            if os.path.exists("/opt/homebrew/bin/bash"): bash_bin = "/opt/homebrew/bin/bash"
-            elif os.path.exists("/usr/local/bin/bash"): bash_bin = "/usr/local/bin/bash"
-
-            os.execvp(bash_bin, ["bash", "--noprofile", "--rcfile", rc_path, "-i"])
-        except:
-            os._exit(1)
-    return pid, fd
-
-def _create_bashrc():
-    bashrc = """
+# rcfile for the spawned shell; bytes so it can be written without encoding.
+_BASHRC = b"""
 [ -f /etc/bashrc ] && source /etc/bashrc
 [ -f ~/.bashrc ] && source ~/.bashrc
 
@@ -95,7 +53,113 @@ if ((BASH_VERSINFO[0] < 4)); then
 fi
 
 PS1="\\[\\033[1;34m\\]ThinkShell\\[\\033[0m\\] $ "
+
+# Close the inherited memfd this file was read from, so user commands don't get it
+if [ -n "$TS_RC_FD" ]; then
+    eval "exec $TS_RC_FD<&-"
+    unset TS_RC_FD
+fi
 """
-    with tempfile.NamedTemporaryFile(mode="w", delete=False) as f:
-        f.write(bashrc)
-    return f.name
+
+
+@functools.lru_cache(maxsize=1)
+def get_controller_path():
+    """
+    Robustly finds the controller script.
+    Works in:
+    1. Dev mode (current dir)
+    2. Installed mode (~/.thinkshell)
+    3. Frozen/Binary mode
+    """
+    # 1. Get the directory containing THIS file (pty_shell.py)
+    # This is the most reliable anchor.
+    current_script_dir = Path(__file__).resolve().parent
+
+    # 2. Same directory, then 'controller' subdirectory (Dev structure),
+    # then Current Working Directory (last resort)
+    candidates = (
+        current_script_dir / "thinkshellctl.py",
+        current_script_dir / "controller" / "thinkshellctl.py",
+        Path.cwd() / "thinkshellctl.py",
+    )
+    for candidate in candidates:
+        try:
+            os.stat(candidate)
+        except OSError:
+            continue
+        return str(candidate)
+
+    # If we are here, installation is broken.
+    # Return a path that will likely error out clearly
+    return str(candidates[0])
+
+def spawn_shell():
+    # Built before fork so the child only has to exec.
+    child_env = {**os.environ, "TS_CTL": get_controller_path(), "TS_PY": sys.executable}
+    if sys.platform.startswith("linux") and hasattr(os, "posix_spawn"):
+        try:
+            return _spawn_posix(child_env)
+        except NotImplementedError:
+            pass
+
+    pid, fd = pty.fork()
+    if pid == 0:
+        try:
+            rc_path, rc_fd = _create_bashrc()
+            if rc_fd is not None:
+                child_env["TS_RC_FD"] = str(rc_fd)
+            os.execve(_BASH_BIN, ["bash", "--noprofile", "--rcfile", rc_path, "-i"], child_env)
+        except:
+            os._exit(1)
+    return pid, fd
+
+def _spawn_posix(child_env):
+    """
+    Starts bash on a fresh PTY with posix_spawn, skipping the fork of the
+    whole interpreter. Returns (pid, master_fd) like pty.fork().
+    """
+    master, slave = os.openpty()
+    rc_path, rc_fd = _create_bashrc()
+    if rc_fd is not None:
+        child_env["TS_RC_FD"] = str(rc_fd)
+    try:
+        # After setsid, opening the slave by name makes it the controlling tty.
+        # Both openpty fds are close-on-exec; only the rcfile memfd is inherited.
+        pid = os.posix_spawn(
+            _BASH_BIN,
+            ["bash", "--noprofile", "--rcfile", rc_path, "-i"],
+            child_env,
+            file_actions=[
+                (os.POSIX_SPAWN_OPEN, 0, os.ttyname(slave), os.O_RDWR, 0),
+                (os.POSIX_SPAWN_DUP2, 0, 1),
+                (os.POSIX_SPAWN_DUP2, 0, 2),
+            ],
+            setsid=True,
+        )
+    except BaseException:
+        os.close(master)
+        raise
+    finally:
+        os.close(slave)
+        if rc_fd is not None:
+            os.close(rc_fd)
+    return pid, master
+
+def _create_bashrc():
+    """
+    Returns (path, fd) for an rcfile bash can read; fd is None for a tempfile.
+    On Linux the rcfile lives in a memfd (no disk write, nothing left behind);
+    the fd is inheritable, so bash opens it via /proc/self/fd after exec, and
+    the rcfile closes it again via TS_RC_FD.
+    """
+    if hasattr(os, "memfd_create"):
+        try:
+            fd = os.memfd_create("thinkshell_rc", 0)
+            os.write(fd, _BASHRC)
+            return f"/proc/self/fd/{fd}", fd
+        except OSError:
+            pass
+
+    with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
+        f.write(_BASHRC)
+    return f.name, None
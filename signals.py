@@ -1,9 +1,25 @@
+import os
 import signal
-from winsize import set_pty_size
 
-def setup_signals(pty_fd):
-    def _handler(signum, frame):
-        set_pty_size(pty_fd)
+
+def setup_signals():
+    """
+    Routes SIGWINCH through a self-pipe and returns its read end.
+    The handler only writes a byte; the I/O loop resizes the PTY once per
+    wake-up, so a burst of signals during a resize drag costs one resize.
+    """
+    r, w = os.pipe()
+    os.set_blocking(r, False)
+    os.set_blocking(w, False)
+
+    # Defaults bound once, so the signal path does no global lookups.
+    def _handler(signum, frame, _write=os.write, _fd=w):
+        try:
+            _write(_fd, b"\0")
+        except BlockingIOError:
+            # Pipe full: a resize is already pending.
+            pass
 
     # Trigger on window resize
     signal.signal(signal.SIGWINCH, _handler)
+    return r
@@ -1,29 +1,52 @@
-import os
+import ctypes
 import fcntl
-import struct
 import termios
 import sys
 
+
+class _Winsize(ctypes.Structure):
+    # struct winsize from <sys/ioctl.h>
+    _fields_ = [
+        ("rows", ctypes.c_ushort),
+        ("cols", ctypes.c_ushort),
+        ("x_pix", ctypes.c_ushort),
+        ("y_pix", ctypes.c_ushort),
+    ]
+
+
+# Reused by every call; ioctl fills it in place, so nothing is packed or unpacked.
+_WS = _Winsize()
+# (rows, cols) last written to the PTY; spurious SIGWINCHs repeat it.
+_last = (0, 0)
+
+# The real terminal's fd doesn't change during a session.
+try:
+    _stdout_fd = sys.stdout.fileno()
+except (AttributeError, ValueError):
+    _stdout_fd = 1
+
+
 def set_pty_size(pty_fd):
     """
     Copies the window size (rows/cols) from the real terminal (stdin)
     to the PTY file descriptor.
     """
+    global _last
     try:
         # 1. Get size from REAL terminal (sys.stdout or sys.stdin)
-        # We use struct.pack to create a buffer for the result
-        result = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b'\0'*8)
-
-        # 2. Unpack (rows, cols, x_pixels, y_pixels)
-        rows, cols, x_pix, y_pix = struct.unpack("HHHH", result)
+        # The kernel writes straight into the reusable struct
+        fcntl.ioctl(_stdout_fd, termios.TIOCGWINSZ, _WS)
 
-        # 3. Apply to PTY
+        # 2. Apply to PTY
         # If cols is 0 (headless mode?), default to 80 to prevent crashes
-        if cols == 0: cols = 80
-        if rows == 0: rows = 24
+        if _WS.cols == 0: _WS.cols = 80
+        if _WS.rows == 0: _WS.rows = 24
 
-        new_size = struct.pack("HHHH", rows, cols, x_pix, y_pix)
-        fcntl.ioctl(pty_fd, termios.TIOCSWINSZ, new_size)
+        size = (_WS.rows, _WS.cols)
+        if size == _last:
+            return
+        fcntl.ioctl(pty_fd, termios.TIOCSWINSZ, _WS)
+        _last = size
 
     except Exception:
         # Fallback if not running in a real terminal